@@ -7,48 +7,266 @@ Need to try the same thing with selenium.
 """
 
 # Software packages.
+import argparse
 from arcgis.features import FeatureLayer
 import pandas as pd
 import numpy as np
-import requests
-from time import sleep
-import scrapy
-from collections import defaultdict
+import aiohttp
+import asyncio
+from tenacity import (retry, retry_if_exception_type, retry_if_result,
+                      stop_after_attempt, wait_exponential)
+from lxml import etree
+import lxml.html
+from tqdm.auto import tqdm
+import random
+import json
 import re
+import sqlite3
+from collections import defaultdict
+import time
+from urllib.parse import urlparse
+
+# uvloop is a faster drop-in event loop, it is not available on Windows.
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
 
 # pandas options.
 pd.options.display.max_columns = 25
 
-def xpath_select(sel: scrapy.selector.unified.Selector, xpath: str) -> str:
+# AutoThrottle settings for pacing requests to BC Assessment's website.
+AUTOTHROTTLE_START_DELAY = 5
+AUTOTHROTTLE_MIN_DELAY = 1
+AUTOTHROTTLE_MAX_DELAY = 60
+AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
+RANDOMIZE_DOWNLOAD_DELAY = True
+
+# HTTP settings shared by every request to BC Assessment's website. One
+# session keeps its connections alive so the TCP and TLS handshakes are paid
+# once per connection instead of once per request.
+HEADERS = {
+            "User-Agent": "pg_housing property data scraper",
+            "Accept-Encoding": "gzip"
+    }
+CONNECTION_LIMIT = 32
+KEEPALIVE_TIMEOUT = 30
+
+# Requests allowed in flight per hostname, and the amount of properties
+# scheduled on the event loop at once. The pace of the requests is set by the
+# AutoThrottle delay, this only bounds bursts.
+CONCURRENT_REQUESTS_PER_DOMAIN = 8
+CHUNK_SIZE = 1000
+
+# Transient response codes that are retried with exponential backoff, and the
+# pause used for a 429 response without a usable Retry-After header.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_ATTEMPTS = 6
+RETRY_AFTER_DEFAULT = 60
+
+# On-disk response cache settings. BCA pages change about once per year.
+CACHE_PATH = "bca_cache.sqlite"
+CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
+# IDs of fields of interest with a single value on the property web page.
+ID_RE = re.compile(r"^(?:lbl|manufacture|legal|property-comments)")
+
+# IDs that do not always show up on the property web page.
+DYNAMIC_IDS = [
+                    "lblTotalAssessedLand",
+                    "lblTotalAssessedBuilding",
+                    "lblPreviousAssessedLand",
+                    "lblPreviousAssessedBuilding",
+                    "property-comments",
+                    "lblComments"
+    ]
+
+class AutoThrottle:
+    """
+    Adaptive download delay based on the latency of the server's responses,
+    as done by Scrapy's AutoThrottle extension. The delay moves towards
+    latency / AUTOTHROTTLE_TARGET_CONCURRENCY and is bounded by
+    AUTOTHROTTLE_MIN_DELAY and AUTOTHROTTLE_MAX_DELAY. Responses that are
+    not successful are never allowed to decrease the delay. Like Scrapy's
+    download slots, the delay is the gap between two requests sent to the
+    same hostname, however many requests are allowed in flight.
     """
-    Select values from XML/HTML using XPATH operators. 
+    
+    def __init__(self, start_delay: float = AUTOTHROTTLE_START_DELAY):
+        self.delay = start_delay
+        self.next_send = defaultdict(float)
+        self.locks = defaultdict(asyncio.Lock)
+        
+    def update(self, latency: float, status: int) -> None:
+        """
+        Adjust the delay from a single response.
 
-    Parameters
-    ----------
-    sel : scrapy.selector.unified.Selector
-        A scrapy selector object.
-    xpath : str
-        An XPATH expression.
+        Parameters
+        ----------
+        latency : float
+            Seconds between sending the request and receiving the response.
+        status : int
+            The response status code.
+        """
+        
+        # Average the current delay with the latency derived target delay.
+        target = latency / AUTOTHROTTLE_TARGET_CONCURRENCY
+        new_delay = (self.delay + target) / 2
+        new_delay = max(AUTOTHROTTLE_MIN_DELAY, 
+                        min(AUTOTHROTTLE_MAX_DELAY, new_delay))
+        
+        # Error responses are usually fast, don't let them speed us up.
+        if status != 200:
+            new_delay = max(self.delay, new_delay)
+            
+        self.delay = new_delay
+        
+    def next_delay(self) -> float:
+        """
+        Returns
+        -------
+        float
+            Seconds to pause before the next request, randomized between
+            0.5 and 1.5 times the current delay.
+        """
+        if RANDOMIZE_DOWNLOAD_DELAY:
+            return self.delay * random.uniform(0.5, 1.5)
+        return self.delay
+    
+    async def wait(self, host: str) -> None:
+        """
+        Waits until a request may be sent to the hostname, then schedules
+        the earliest time of the hostname's next request.
 
-    Returns
-    -------
-    str
-        Returns the selected items from the XPATH expression.
+        Parameters
+        ----------
+        host : str
+            The hostname the request is sent to.
+        """
+        
+        # Requests to the host take turns, each one waiting out the gap left
+        # by the previous one. The deadline is read again after each sleep,
+        # since a rate limited response may push it back in the meantime.
+        async with self.locks[host]:
+            while time.monotonic() < self.next_send[host]:
+                await asyncio.sleep(self.next_send[host] - time.monotonic())
+            self.next_send[host] = max(self.next_send[host],
+                                       time.monotonic() + self.next_delay())
+            
+    def backoff(self, host: str, seconds: float) -> None:
+        """
+        Holds back every request to the hostname for a while, used when the
+        server is rate limiting.
+
+        Parameters
+        ----------
+        host : str
+            The hostname being rate limited.
+        seconds : float
+            Seconds to wait before the hostname's next request.
+        """
+        self.next_send[host] = max(self.next_send[host],
+                                   time.monotonic() + seconds)
+
+class ResponseCache:
+    """
+    SQLite backed cache of GET responses keyed by URL. Successful responses
+    and 404s are stored, so dead roll numbers are not requested again. The
+    (jur, roll) -> web address UID mappings are also stored, they do not 
+    change so they are kept regardless of max_age. The UIDs found during a
+    scrape are memoized in memory too.
     """
-    x = sel.xpath(xpath)
-    x = x.extract()
-    return x
+    
+    def __init__(self,
+                 path: str = CACHE_PATH,
+                 max_age: float = CACHE_MAX_AGE,
+                 force_refresh: bool = False):
+        self.max_age = max_age
+        self.force_refresh = force_refresh
+        self.uids = {}
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache("
+                          "url TEXT PRIMARY KEY, status INT, body TEXT, "
+                          "fetched_at REAL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS uids("
+                          "jur TEXT, roll TEXT, uid TEXT, "
+                          "PRIMARY KEY (jur, roll))")
+        
+    def get(self, url: str) -> tuple:
+        """
+        Returns
+        -------
+        tuple
+            The (status, body) of a fresh cached response, or None if the
+            URL has to be fetched.
+        """
+        if self.force_refresh:
+            return None
+        row = self.conn.execute("SELECT status, body, fetched_at FROM cache "
+                                "WHERE url = ?", (url,)).fetchone()
+        if row is None or time.time() - row[2] > self.max_age:
+            return None
+        return row[0], row[1]
+    
+    def set(self, url: str, status: int, body: str) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                          (url, status, body, time.time()))
+        self.conn.commit()
+        
+    def delete(self, url: str) -> None:
+        self.conn.execute("DELETE FROM cache WHERE url = ?", (url,))
+        self.conn.commit()
+        
+    def get_uid(self, jur: str, roll: str) -> str:
+        """
+        Returns
+        -------
+        str
+            The stored web address UID of the property, or None if it has
+            to be looked up.
+        """
+        
+        # UIDs found earlier in this scrape.
+        key = (jur, roll)
+        if key in self.uids:
+            return self.uids[key]
+        
+        # UIDs found by previous runs.
+        if self.force_refresh:
+            return None
+        row = self.conn.execute("SELECT uid FROM uids WHERE jur = ? AND "
+                                "roll = ?", (jur, roll)).fetchone()
+        if row is None:
+            return None
+        self.uids[key] = row[0]
+        return row[0]
+    
+    def set_uid(self, jur: str, roll: str, uid: str) -> None:
+        self.uids[(jur, roll)] = uid
+        self.conn.execute("INSERT OR REPLACE INTO uids VALUES (?, ?, ?)",
+                          (jur, roll, uid))
+        self.conn.commit()
+        
+    def close(self) -> None:
+        self.conn.close()
 
-def get_roll_nums(jur = 226) -> pd.core.frame.DataFrame:
+def get_roll_nums(jur = 226,
+                  server_filter: bool = True) -> pd.core.frame.DataFrame:
     """
     Function that retreives data from BC Assessment's Service Boundary Web 
     Map GIS data service. The main values of interest are in the ROLL_NUM
     column that can be used for scraping data from BC Assessment's website.
-    
-    *** 
-    This function is in need of a performance improvement.
-    I need to find a way to query just the Prince George area for data.
-    ***
+    Only the jurisdiction's properties are requested from the service.
+
+    Parameters
+    ----------
+    jur : int
+        The jurisdiction code, defaults to Prince George (226).
+    server_filter : bool
+        Filter the jurisdiction's properties on the GIS server. If False, the
+        whole layer is requested and filtered locally, for servers that do 
+        not support the where clause.
 
     Returns
     -------
@@ -74,32 +292,36 @@ def get_roll_nums(jur = 226) -> pd.core.frame.DataFrame:
     url = "".join(["https://arcgis.bcassessment.ca/ext_wa/", 
                    "rest/services/SBWM/SBWM/MapServer/2/"])
     
-    # Columns to drop in the spatial dataframe.
-    drop_cols = [
-                    "OBJECTID",
-                    "PARID",
-                    "YEAR",
-                    "AFP_OID",
-                    "ROLL_TOTAL",
-                    "ROLL_BLDG",
-                    "ROLL_LAND",
-                    "TOTAL_ASSESSED_VALUE",
-                    "SHAPE"
-            ]
-    
-    # Request data as a spatial dataframe.
-    layer = FeatureLayer(url)
-    df = layer.query().df
+    # Columns to request from the feature layer.
+    out_fields = ["ROLL_NUM", "IMPR_VALUE", "LAND_VALUE"]
     
-    # Subset the data for Prince George properties.
-    df = df[df["AFP_OID"].str.startswith(f"{jur}")]
+    # Request the jurisdiction's properties, without geometry, as a dataframe.
+    layer = FeatureLayer(url)
+    if server_filter:
+        df = layer.query(where = f"AFP_OID LIKE '{jur}%'",
+                         out_fields = ",".join(out_fields),
+                         return_geometry = False,
+                         as_df = True)
+        
+    # Otherwise request every property and subset the jurisdiction's 
+    # properties with a vectorized prefix match.
+    else:
+        df = layer.query(out_fields = ",".join(out_fields + ["AFP_OID"]),
+                         return_geometry = False,
+                         as_df = True)
+        df = df.reindex(columns = out_fields + ["AFP_OID"])
+        mask = np.char.startswith(df["AFP_OID"].to_numpy(dtype = str), 
+                                  str(jur))
+        df = df.iloc[mask]
     
-    # Drop unwanted columns.
-    df.drop(columns = drop_cols, inplace = True)
+    # The service always adds OBJECTID, keep just the requested columns. An
+    # empty query result may have no columns at all.
+    df = df.reindex(columns = out_fields)
     
-    # Change column values from float to int.
-    df["IMPR_VALUE"] = df["IMPR_VALUE"].astype("Int32")
-    df["LAND_VALUE"] = df["LAND_VALUE"].astype("Int32")
+    # Change column values from float to int, in a single cast over both
+    # columns so they share a fixed width that doesn't depend on the data.
+    value_cols = ["IMPR_VALUE", "LAND_VALUE"]
+    df[value_cols] = df[value_cols].astype("Int32")
     
     # Add Prince George JUR number.
     df.insert(0, "JUR", jur)
@@ -113,137 +335,472 @@ def get_roll_nums(jur = 226) -> pd.core.frame.DataFrame:
     # Return data.
     return df
 
-def get_web_uid(jur: str, roll: str) -> str:
+def chunks(seq: list, chunk_size: int = CHUNK_SIZE):
+    """
+    Splits a sequence into consecutive chunks.
+
+    Parameters
+    ----------
+    seq : list
+        The sequence to split.
+    chunk_size : int
+        The maximum length of each chunk.
+
+    Yields
+    ------
+    list
+        The next chunk of the sequence.
+    """
+    for i in range(0, len(seq), chunk_size):
+        yield seq[i:i + chunk_size]
+
+def make_session() -> aiohttp.ClientSession:
+    """
+    Creates the HTTP session shared by all requests in a scrape.
+
+    Returns
+    -------
+    aiohttp.ClientSession
+        A session with pooled keep-alive connections, cached DNS lookups and
+        compressed responses.
+    """
+    connector = aiohttp.TCPConnector(limit = CONNECTION_LIMIT,
+                                     keepalive_timeout = KEEPALIVE_TIMEOUT,
+                                     ttl_dns_cache = 300)
+    return aiohttp.ClientSession(connector = connector, headers = HEADERS)
+
+def retry_after(value: str) -> float:
+    """
+    Parameters
+    ----------
+    value : str
+        The Retry-After header of a response, if any.
+
+    Returns
+    -------
+    float
+        Seconds to wait before retrying. Falls back to RETRY_AFTER_DEFAULT
+        if the header is missing or is not a number of seconds.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return RETRY_AFTER_DEFAULT
+
+@retry(retry = (retry_if_exception_type((aiohttp.ClientError, 
+                                           asyncio.TimeoutError))
+                | retry_if_result(lambda res: res[0] in RETRY_STATUSES)),
+       wait = wait_exponential(multiplier = 1, min = 2, max = 60),
+       stop = stop_after_attempt(RETRY_ATTEMPTS),
+       retry_error_callback = lambda state: state.outcome.result())
+async def _request(session: aiohttp.ClientSession,
+                   sems: dict,
+                   throttle: AutoThrottle,
+                   url: str) -> tuple:
+    
+    # Wait for a free slot on the URL's hostname, and then for the host's
+    # turn. Be respectful, requests are spaced as much as the server needs.
+    host = urlparse(url).netloc
+    async with sems[host]:
+        await throttle.wait(host)
+    
+        # Make the request.
+        t_start = time.monotonic()
+        async with session.get(url) as r:
+            throttle.update(time.monotonic() - t_start, r.status)
+            status, body = r.status, await r.text()
+            
+            # If the server is rate limiting, wait as long as it asks to.
+            if status == 429:
+                wait = retry_after(r.headers.get("Retry-After"))
+                throttle.backoff(host, wait)
+    
+    # Return the status code and body.
+    return status, body
+
+async def cached_get(session: aiohttp.ClientSession,
+                     sems: dict,
+                     throttle: AutoThrottle,
+                     cache: ResponseCache,
+                     url: str,
+                     parse) -> tuple:
+    """
+    GET request that is served from the on-disk cache when possible. Requests
+    that go to the network hold one of their hostname's in-flight slots, are
+    spaced by the throttle, and are retried with exponential backoff on
+    connection errors and transient response codes. Successful responses are
+    only stored once they have been parsed, so a bad body is fetched again
+    instead of being reused.
+
+    Parameters
+    ----------
+    session : aiohttp.ClientSession
+        The shared HTTP session used for all requests in a scrape.
+    sems : dict
+        Semaphores bounding the requests in flight to each hostname.
+    throttle : AutoThrottle
+        Spaces the requests to each hostname, and is updated with the
+        latency of the response.
+    cache : ResponseCache
+        The on-disk response cache.
+    url : str
+        The URL to request.
+    parse : callable
+        Parses the body of a successful response, raising an error if the
+        body is not valid.
+
+    Raises
+    ------
+    Raises an error if a 200 or 404 reponse code is not given in the request
+    once the retries are exhausted, or if the body can't be parsed.
+
+    Returns
+    -------
+    tuple
+        The (status, value) of the response. The value is the parsed body
+        of a successful response, or the raw body of a 404.
+    """
+    
+    # Serve a fresh cached response without touching the network. Drop the
+    # entry and fetch it again if it can't be parsed.
+    hit = cache.get(url)
+    if hit is not None:
+        status, body = hit
+        if status != 200:
+            return status, body
+        try:
+            return status, parse(body)
+        except (ValueError, etree.ParserError):
+            cache.delete(url)
+    
+    # Make the request, retrying transient failures.
+    status, body = await _request(session, sems, throttle, url)
+    
+    # Raise error if the request was neither successful nor a dead page.
+    if status not in (200, 404):
+        raise ValueError(f"Unsuccessful response. Status code {status}: {url}")
+    
+    # Parse successful responses before storing them, 404s are stored as is.
+    value = parse(body) if status == 200 else body
+    cache.set(url, status, body)
+    
+    # Return the status code and value.
+    return status, value
+
+def parse_uid(body: str) -> str:
+    """
+    Parses the response of BCA's hidden roll number API. The body is a JSON
+    string like "ok-12345", so it is stripped directly and the JSON parser is
+    only used for any other shape.
+
+    Parameters
+    ----------
+    body : str
+        The body of the response.
+
+    Raises
+    ------
+    Raises an error if the body is not a JSON string.
+
+    Returns
+    -------
+    str
+        The URL UID for BCA's online assessment search.
+    """
+    body = body.strip()
+    if body.startswith('"'):
+        return body.strip('"').removeprefix("ok-")
+    uid = json.loads(body)
+    if not isinstance(uid, str):
+        raise ValueError(f"Unexpected UID response: {body[:100]!r}")
+    return uid.removeprefix("ok-")
+
+async def fetch_uid(session: aiohttp.ClientSession,
+                    sems: dict,
+                    throttle: AutoThrottle,
+                    cache: ResponseCache,
+                    jur: str,
+                    roll: str) -> str:
     """
     Retrieves a UID that can be used to scrape data from BCA's online 
     assessment search.
 
     Parameters
     ----------
+    session : aiohttp.ClientSession
+        The shared HTTP session used for all requests in a scrape.
+    sems : dict
+        Semaphores bounding the requests in flight to each hostname.
+    throttle : AutoThrottle
+        Updated with the latency of the response.
+    cache : ResponseCache
+        The on-disk response cache.
     jur : str
         The jurisdiction code for the local government level. Used to for
         tax legislation purposes.
     roll : str
-        
+        The roll number for the property.
+
     Raises
     ------
-    Raises an error if a 200 reponse code is not given in the request.
+    Raises an error if the response body is not a JSON string.
 
     Returns
     -------
     str
-        The URL UID for BCA's online assessment search.
+        The URL UID for BCA's online assessment search, or None if the
+        roll number was not found.
     """
     
+    # Return the UID if it was already looked up.
+    uid = cache.get_uid(jur, roll)
+    if uid is not None:
+        return uid
+    
     # Hidden API base URL.
     base_url = "https://www.bcassessment.ca/Property/Search/GetByRollNumber/"
     
-    # Make request to the hidden API.
-    r = requests.get(f"{base_url}{jur}?roll={roll}")
-
-    # Retreive web address UID if request was successful. 
-    if r.status_code == 200:
-        uid = r.json().replace("ok-", "")
-        
-    # Raise error if there is a different status code.
-    else: 
-        r.raise_for_status()
-        raise ValueError("Successful reponse. Unknown status code.")
-        
+    # Make request to the hidden API, and retreive the UID unless the roll
+    # number does not exist.
+    status, uid = await cached_get(session, sems, throttle, cache,
+                                   f"{base_url}{jur}?roll={roll}", parse_uid)
+    if status == 404:
+        uid = None
+    
+    # Keep found UIDs for the rest of the scrape and for future runs.
+    if uid is not None:
+        cache.set_uid(jur, roll, uid)
+    
     # Return the web address UID.
     return uid
 
-def get_bca_data(jurs: np.ndarray,
-                 rolls: np.ndarray) -> pd.core.frame.DataFrame:
+def parse_property(html: str) -> dict:
+    """
+    Parses the printing-friendly display of a property's web page.
+
+    Parameters
+    ----------
+    html : str
+        The raw HTML of the property's web page.
+
+    Returns
+    -------
+    dict
+        Maps the ids of fields of interest to the first direct text node of
+        the first element with that id, NaN if the field has no text.
+    """
+    
+    # Map the ids of interest to their text in a single walk of the page.
+    tree = lxml.html.fromstring(html)
+    id_text = {}
+    for el in tree.iter(etree.Element):
+        id_name = el.get("id")
+        if id_name and ID_RE.match(id_name) and id_name not in id_text:
+            
+            # The first text node is either before the first child, or the
+            # tail of a child, e.g. <div id="legal1"><br/>Lot 1</div>.
+            text = el.text
+            if text is None:
+                text = next((child.tail for child in el 
+                             if child.tail is not None), "")
+            id_text[id_name] = text.strip() or np.nan
+    
+    # Return the field values.
+    return id_text
+
+async def fetch_property(session: aiohttp.ClientSession,
+                         sems: dict,
+                         throttle: AutoThrottle,
+                         cache: ResponseCache,
+                         jur: str,
+                         roll: str) -> dict:
+    """
+    Retrieves and parses the printing-friendly display of a property's web
+    page on BCA's online assessment search. The raw HTML is dropped as soon
+    as it is parsed.
+
+    Parameters
+    ----------
+    session : aiohttp.ClientSession
+        The shared HTTP session used for all requests in a scrape.
+    sems : dict
+        Semaphores bounding the requests in flight to each hostname.
+    throttle : AutoThrottle
+        Paces the requests, shared by every fetch in a scrape.
+    cache : ResponseCache
+        The on-disk response cache.
+    jur : str
+        The jurisdiction code for the property.
+    roll : str
+        The roll number for the property.
+
+    Returns
+    -------
+    dict
+        The property's field values from parse_property, or None if the 
+        property was not found or could not be fetched.
+    """
     
-    # Empty list-dictionary to append values to. 
-    dict_data = defaultdict(list)
+    # Base URL for the printing-friendly display of the property's web page.
+    base_url = "https://www.bcassessment.ca/property/info/print/"
     
-    # Amount of records to scrape.
-    n = len(jurs)
+    # Get web address UID, then make request to get raw HTML data and parse
+    # it. Report and skip the property if it still fails after the retries,
+    # or if the page can't be parsed, so the rest of the scrape carries on.
+    try:
+        uid = await fetch_uid(session, sems, throttle, cache, jur, roll)
+        if uid is None:
+            return None
+        status, id_text = await cached_get(session, sems, throttle, cache,
+                                           f"{base_url}{uid}", parse_property)
+        return id_text if status == 200 else None
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError,
+            etree.ParserError) as e:
+        tqdm.write(f"Failed to scrape jur {jur} roll {roll}: {e!r}")
+        return None
+
+async def _fetch_properties(jurs: np.ndarray,
+                            rolls: np.ndarray,
+                            concurrency: int,
+                            cache: ResponseCache) -> list:
     
-    # Create iteration data for the main loop.
-    prop_iter = zip(jurs, rolls)
+    # Bound the amount of requests in flight to each hostname.
+    sems = defaultdict(lambda: asyncio.Semaphore(concurrency))
     
-    # Iterate through jurisdiction and roll numbers.
-    for i, (jur, roll) in enumerate(prop_iter):
+    # Adapt the pause between requests to the server's latency.
+    throttle = AutoThrottle()
     
-        # Base URL for the printing-friendly display of the property's web page.
-        base_url = "https://www.bcassessment.ca/property/info/print/"
-        
-        # IDs that do not always show up on the property web page.
-        dynamic_ids = [
-                            "lblTotalAssessedLand",
-                            "lblTotalAssessedBuilding",
-                            "lblPreviousAssessedLand",
-                            "lblPreviousAssessedBuilding",
-                            "property-comments",
-                            "lblComments"
-            ]
-        
-        # Get web address UID.
-        uid = get_web_uid(jur, roll)
-        
-        # Make request to get raw HTML data.
-        r = requests.get(f"{base_url}{uid}")
-        
-        # Retreive HTML if request was successful. 
-        if r.status_code == 200:
-            html = r.text
+    # Empty list to append the parsed page of each property to.
+    pages = []
+    
+    # Reuse pooled keep-alive connections for every request, and report
+    # progress on a single bar as fetches complete.
+    async with make_session() as session:
+        with tqdm(total = len(jurs), desc = "Properties scraped") as pbar:
         
-        # Raise error if there is a different status code.
-        else: 
-            r.raise_for_status()
-            raise ValueError("Successful reponse. Unknown status code.")
+            # Schedule the properties in chunks to bound the amount of tasks.
+            for chunk in chunks(list(zip(jurs, rolls))):
+                tasks = [asyncio.ensure_future(
+                            fetch_property(session, sems, throttle, cache,
+                                           str(j), str(r)))
+                         for j, r in chunk]
+                for task in tasks:
+                    task.add_done_callback(lambda _: pbar.update())
+                pages.extend(await asyncio.gather(*tasks))
             
-        # Create scrapy selector object.
-        sel = scrapy.Selector(text = html)
-        
-        # Get IDs for fields of interest with a single value.
-        ids_regex = "^lbl|^manufacture|^legal|^property-comments"
-        ids = xpath_select(sel, "//@id")
-        ids = list(filter(lambda x: bool(re.search(ids_regex, x)), ids))
+    # Return the parsed pages.
+    return pages
+
+def get_bca_data(jurs: np.ndarray,
+                 rolls: np.ndarray,
+                 concurrency: int = CONCURRENT_REQUESTS_PER_DOMAIN,
+                 max_age: float = CACHE_MAX_AGE,
+                 force_refresh: bool = False,
+                 max_records: int = None) -> pd.core.frame.DataFrame:
+    """
+    Scrapes property data from the printing-friendly display of each
+    property's web page on BCA's online assessment search. Responses are
+    cached on disk, so re-runs only go to the network for new or stale pages.
+
+    Parameters
+    ----------
+    jurs : np.ndarray
+        The jurisdiction code of each property.
+    rolls : np.ndarray
+        The roll number of each property.
+    concurrency : int
+        The maximum amount of requests in flight to each hostname. The pace
+        of the requests is set by AutoThrottle.
+    max_age : float
+        Seconds a cached response is reused before it is fetched again.
+    force_refresh : bool
+        Ignore the on-disk cache and fetch every property again.
+    max_records : int
+        Only scrape the first max_records properties, useful for test runs.
+        Every property is scraped if None.
+
+    Raises
+    ------
+    Raises an error if max_records is negative.
+
+    Returns
+    -------
+    df : pandas.core.frame.DataFrame
+        One row per property with the jur and roll columns, followed by a
+        column for each field of interest found on any property's web page.
+        Fields are NaN when they are missing from a page, and every field is
+        NaN for properties that were not found or could not be fetched.
+    """
+    
+    # Only scrape the first max_records properties, useful for test runs.
+    if max_records is not None:
+        if max_records < 0:
+            raise ValueError("max_records must be 0 or more.")
+        jurs = jurs[:max_records]
+        rolls = rolls[:max_records]
+    
+    # Fetch and parse every property concurrently, reusing any responses
+    # cached by previous runs.
+    cache = ResponseCache(max_age = max_age, force_refresh = force_refresh)
+    try:
+        pages = asyncio.run(_fetch_properties(jurs, rolls, concurrency, cache))
+    finally:
+        cache.close()
+    
+    # Keep an empty row for the properties that could not be scraped.
+    missing = sum(id_text is None for id_text in pages)
+    if missing:
+        print(f"{missing} out of {len(pages)} properties were not found or "
+              "could not be fetched.")
+    parsed = [(jur, roll, id_text or {}) 
+              for jur, roll, id_text in zip(jurs, rolls, pages)]
         
-        # Add the juristdiction and roll number to the dataframe.
-        dict_data["jur"] = jur
-        dict_data["roll"] = roll
+    # Columns are the union of the ids found on any page plus the dynamic ids.
+    ids = set(DYNAMIC_IDS).union(*(id_text for _, _, id_text in parsed))
+    cols = ("jur", "roll") + tuple(sorted(ids))
+    
+    # Fill a preallocated array one property per row, missing ids are NaN.
+    data = np.full((len(parsed), len(cols)), np.nan, dtype = object)
+    for i, (jur, roll, id_text) in enumerate(parsed):
+        data[i, 0] = jur
+        data[i, 1] = roll
+        data[i, 2:] = [id_text.get(id_name, np.nan) for id_name in cols[2:]]
         
-        # Iterate through id values.
-        for id_name in ids:
-            
-            # Select id, using xpath.
-            value = xpath_select(sel, f"//*[@id='{id_name}']/text()")
-            
-            # If list is empty append NaN, otherwise append the value.
-            if not value:
-                dict_data[id_name].append(np.nan)
-                continue
-            else:
-                value = value[0].strip()
-                value = np.nan if value == "" else value
-                dict_data[id_name].append(value)
-                
-        # Iterate through dynamic ids and populate any missing values.
-        for id_name in dynamic_ids:
-            if id_name not in ids:
-                dict_data[id_name].append(np.nan)
-
-        # Print current iteration progress.
-        print(f"{i + 1} out of {n} records scraped.")
-        print(f"{round((i + 1) / n, 4) * 100}% complete.")
-        print()
-        
-        # Be respectful, pause the scraping function to give the server a break.
-        sleep(3)
-                
-    # Create dataframe from dictionary.
-    df = pd.DataFrame(dict_data)
+    # Create dataframe from the array in one shot.
+    df = pd.DataFrame(data, columns = cols)
         
     # Return the property data.
     return df
     
     
-roll_df = get_roll_nums()
-jurs = roll_df["JUR"].values
-rolls = roll_df["ROLL_NUM"].values
-bca_df = get_bca_data(jurs, rolls)
+if __name__ == "__main__":
+    
+    # Command line options.
+    parser = argparse.ArgumentParser(
+        description = "Scrape Prince George property data from BCA.")
+    parser.add_argument("--jur", type = int, default = 226,
+                        help = "BCA jurisdiction code to scrape.")
+    parser.add_argument("--max-records", type = int, default = None,
+                        help = "Stop after scraping this many properties.")
+    parser.add_argument("--force-refresh", action = "store_true",
+                        help = "Ignore the on-disk response cache.")
+    parser.add_argument("--output", default = None,
+                        help = "CSV file to write the scraped data to. "
+                               "Prints the data if not given.")
+    args = parser.parse_args()
+    if args.max_records is not None and args.max_records < 0:
+        parser.error("--max-records must be 0 or more.")
+    
+    roll_df = get_roll_nums(args.jur)
+    jurs = roll_df["JUR"].values
+    rolls = roll_df["ROLL_NUM"].values
+    bca_df = get_bca_data(jurs, rolls, 
+                          force_refresh = args.force_refresh,
+                          max_records = args.max_records)
+    
+    # Save or show the scraped data.
+    if args.output is not None:
+        bca_df.to_csv(args.output, index = False)
+        print(f"{len(bca_df)} properties written to {args.output}.")
+    else:
+        print(bca_df)